@@ -4,23 +4,74 @@ Single-file implementation with REST API endpoints
 """
 
 import os
+import re
+import math
+import hashlib
+import shutil
+import sqlite3
+import threading
+import time
 import django
 from django.conf import settings
-from django.core.wsgi import get_wsgi_application
-from django.db import models
-from django.http import JsonResponse
+from django.core.exceptions import RequestDataTooBig
+from django.utils import timezone
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Q
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.urls import path
-from django.core.management import execute_from_command_line
 import json
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from decimal import Decimal
+from functools import wraps
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: partition locks then only cover this process
+    fcntl = None
 
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
+# Limits for POST /api/verify-bill/ (JSON and NDJSON bodies)
+MAX_BILL_PAYLOAD_BYTES = int(os.environ.get('MAX_BILL_PAYLOAD_BYTES', 5 * 1024 * 1024))
+MAX_BILL_ITEMS = int(os.environ.get('MAX_BILL_ITEMS', 1000))
+
+# Admission control for POST /api/check-price/ and /api/verify-bill/
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 8))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 16))
+ADMISSION_WAIT_SECONDS = float(os.environ.get('ADMISSION_WAIT_SECONDS', 0.5))
+# RATE_LIMIT_PER_SECOND=0 turns per-client rate limiting off
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', 5))
+RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 20))
+
+# Monthly bill partitions: bills/bill_items live in one SQLite file per bill_date month
+PARTITION_DIR = os.environ.get('PARTITION_DIR', 'partitions')
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(PARTITION_DIR, 'archive'))
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', 6))
+# Bill ids in a partition start at YYYYMM * BILL_ID_STRIDE, so an id names its month
+BILL_ID_STRIDE = 10 ** 7
+
+# Idempotent submissions: a claim with no response after IDEMPOTENCY_CLAIM_TIMEOUT
+# seconds is taken as abandoned; stored responses are replayed for IDEMPOTENCY_RETENTION
+IDEMPOTENCY_CLAIM_TIMEOUT = int(os.environ.get('IDEMPOTENCY_CLAIM_TIMEOUT', 300))
+IDEMPOTENCY_RETENTION = int(os.environ.get('IDEMPOTENCY_RETENTION', 24 * 3600))
+
+# Optional read replica: report endpoints read a read-only snapshot of the databases
+READ_REPLICA = os.environ.get('READ_REPLICA', '') == '1'
+REPLICA_DIR = os.environ.get('REPLICA_DIR', 'replica')
+REPLICA_MAX_STALENESS = float(os.environ.get('REPLICA_MAX_STALENESS', 5))
+REPLICA_MMAP_BYTES = int(os.environ.get('REPLICA_MMAP_BYTES', 256 * 1024 * 1024))
+REPLICA_BACKUP_PAGES = int(os.environ.get('REPLICA_BACKUP_PAGES', 1024))
+
+# Bump when a model gains a table or column so ensure_schema() runs again
+SCHEMA_VERSION = 1
+
 if not settings.configured:
     settings.configure(
         DEBUG=True,
@@ -31,10 +82,7 @@ if not settings.configured:
             'django.middleware.common.CommonMiddleware',
             'django.middleware.csrf.CsrfViewMiddleware',
         ],
-        INSTALLED_APPS=[
-            'django.contrib.contenttypes',
-            'django.contrib.auth',
-        ],
+        INSTALLED_APPS=[],
         DATABASES={
             'default': {
                 'ENGINE': 'django.db.backends.sqlite3',
@@ -42,6 +90,7 @@ if not settings.configured:
             }
         },
         CORS_ALLOW_ALL_ORIGINS=True,
+        DATA_UPLOAD_MAX_MEMORY_SIZE=MAX_BILL_PAYLOAD_BYTES,
     )
     django.setup()
 
@@ -149,6 +198,584 @@ class BillItem(models.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class BillArchive(models.Model):
+    """Bill counts of a month partition, taken when it was archived"""
+    month = models.IntegerField(primary_key=True)  # YYYYMM
+    total_bills = models.IntegerField()
+    overcharged_bills = models.IntegerField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        app_label = 'healthcare'
+        db_table = 'bill_archive'
+
+class IdempotencyKey(models.Model):
+    """Stored response of a submission; the primary key is the dedup index"""
+    key = models.CharField(max_length=255, primary_key=True)
+    status = models.IntegerField(null=True)
+    response = models.TextField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        app_label = 'healthcare'
+        db_table = 'idempotency_keys'
+
+# ============================================================================
+# BILL PARTITIONS
+# ============================================================================
+
+PARTITION_FILE = re.compile(r'^bills_(\d{4})_(\d{2})\.db$')
+process_partition_lock = threading.Lock()
+ready_partitions = set()
+
+
+def month_key(bill_date):
+    """Return the YYYYMM partition key for a date"""
+    return bill_date.year * 100 + bill_date.month
+
+
+def partition_file(key):
+    return f'bills_{key // 100:04d}_{key % 100:02d}.db'
+
+
+def list_partitions(directory):
+    """Return {month key: path} for the partition files in a directory"""
+    if not os.path.isdir(directory):
+        return {}
+    partitions = {}
+    for name in os.listdir(directory):
+        match = PARTITION_FILE.match(name)
+        if match:
+            partitions[int(match.group(1)) * 100 + int(match.group(2))] = os.path.join(directory, name)
+    return partitions
+
+
+def partition_alias(path):
+    """Register a partition file as a database alias named after its path"""
+    if path not in connections.settings:
+        connections.settings[path] = {**connections.settings['default'], 'NAME': path}
+    return path
+
+
+@contextmanager
+def partition_lock(key):
+    """Hold the exclusive lock of one month partition.
+
+    The lock is an flock on a file next to the partition, so it also keeps
+    the archive command (a separate process) away from a month being written.
+    """
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    with open(os.path.join(PARTITION_DIR, partition_file(key) + '.lock'), 'a') as lock_file:
+        if fcntl is None:
+            with process_partition_lock:
+                yield
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file closes
+            yield
+
+
+@contextmanager
+def write_partition(bill_date):
+    """Yield the alias of the partition bills dated bill_date are written to.
+
+    The partition is created on first use and stays locked until the block
+    ends, so callers finish their writes inside it. Writing to an archived
+    month moves its file back into the hot set.
+    """
+    key = month_key(bill_date)
+    path = os.path.join(PARTITION_DIR, partition_file(key))
+    alias = partition_alias(path)
+    
+    with partition_lock(key):
+        if not os.path.exists(path):
+            # A connection left open on a file the archiver removed
+            connections[alias].close()
+            archived = os.path.join(ARCHIVE_DIR, partition_file(key))
+            if os.path.exists(archived):
+                os.replace(archived, path)
+                BillArchive.objects.filter(month=key).delete()
+            ready_partitions.discard(alias)
+        
+        if alias not in ready_partitions:
+            ensure_schema(alias, PARTITION_MODELS, {'bills': key * BILL_ID_STRIDE})
+            ready_partitions.add(alias)
+        yield alias
+
+
+def read_partitions(date_from=None, date_to=None):
+    """Return the database aliases holding bills in a bill_date range.
+
+    Without a range only the hot partitions are read; archived months are
+    included when a range touches them. The default database is always
+    included for bills stored before partitioning.
+    """
+    partitions = list_partitions(PARTITION_DIR)
+    if date_from or date_to:
+        partitions = {**list_partitions(ARCHIVE_DIR), **partitions}
+        low = month_key(date_from) if date_from else 0
+        high = month_key(date_to) if date_to else 999999
+        partitions = {k: v for k, v in partitions.items() if low <= k <= high}
+    return ['default'] + [partition_alias(partitions[k]) for k in sorted(partitions, reverse=True)]
+
+
+def bill_partition(bill_id):
+    """Return the database alias holding a bill id, or None"""
+    key = bill_id // BILL_ID_STRIDE
+    if key == 0:
+        return 'default'
+    for directory in (PARTITION_DIR, ARCHIVE_DIR):
+        path = os.path.join(directory, partition_file(key))
+        if os.path.exists(path):
+            return partition_alias(path)
+    return None
+
+
+def archive_partitions(older_than_months=ARCHIVE_AFTER_MONTHS):
+    """Compact hot partitions older than the cutoff into ARCHIVE_DIR"""
+    today = datetime.now().date()
+    months = today.year * 12 + today.month - 1 - older_than_months
+    cutoff = (months // 12) * 100 + months % 12 + 1
+    
+    archived = []
+    for key in sorted(list_partitions(PARTITION_DIR)):
+        if key >= cutoff:
+            continue
+        
+        # Writers hold this lock until they commit, so no bill lands between
+        # the copy and the removal, and a restore waits for the summary row
+        with partition_lock(key):
+            path = os.path.join(PARTITION_DIR, partition_file(key))
+            dest = os.path.join(ARCHIVE_DIR, partition_file(key))
+            if not os.path.exists(path):
+                continue
+            if os.path.exists(dest):
+                print(f"⚠️  Skipping {partition_file(key)}: already archived")
+                continue
+            
+            alias = partition_alias(path)
+            connections[alias].close()
+            ready_partitions.discard(alias)
+            
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+            part = sqlite3.connect(path)
+            total, overcharged = part.execute(
+                'SELECT COUNT(*), COALESCE(SUM(overcharged), 0) FROM bills').fetchone()
+            part.execute('VACUUM INTO ?', (dest,))
+            part.close()
+            os.remove(path)
+            
+            BillArchive.objects.update_or_create(
+                month=key,
+                defaults={'total_bills': total, 'overcharged_bills': overcharged}
+            )
+            archived.append(key)
+    return archived
+
+# ============================================================================
+# READ REPLICA
+# ============================================================================
+
+class SnapshotReplica:
+    """Read-only copies of the databases, refreshed in the background.
+
+    Each refresh copies every source with the SQLite online backup API into a
+    new generation directory and then swaps it in, so open readers never see
+    a file change underneath them. The previous generation is kept for readers
+    still opening it; older ones are deleted.
+
+    A source whose file has not changed since the last copy is linked into the
+    new generation instead of copied again. Changed sources are copied
+    REPLICA_BACKUP_PAGES pages at a time, so writers can take the primary
+    between steps. Every process keeps its generations under its own pid.
+    """
+
+    def __init__(self, directory, max_staleness, sources):
+        self.root = directory
+        self.directory = None
+        self.max_staleness = max_staleness
+        self.sources = sources  # callable returning the database paths to copy
+        self.snapshot = {}
+        self.stamps = {}
+        self.taken_at = None
+        self.generations = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='replica-refresh', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        self.directory = os.path.join(self.root, str(os.getpid()))
+        # Generations left behind by processes that have exited
+        try:
+            for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+                if name.isdigit() and (int(name) == os.getpid() or not process_alive(int(name))):
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        except OSError as e:
+            print(f"⚠️  Replica cleanup failed: {e}")
+        
+        # Until the first refresh succeeds, path_for sends reads to the primary
+        while True:
+            try:
+                self.refresh()
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠️  Replica refresh failed: {e}")
+            time.sleep(self.max_staleness / 2)
+
+    def refresh(self):
+        taken_at = time.monotonic()
+        sources = {}
+        for source in self.sources():
+            if os.path.exists(source):
+                sources[os.path.abspath(source)] = file_stamp(source)
+        if self.generations and sources == self.stamps:
+            # Nothing written since the last copy, so it is still current
+            self.taken_at = taken_at
+            return
+        
+        generation = os.path.join(self.directory, str(time.time_ns()))
+        os.makedirs(generation)
+        
+        snapshot = {}
+        for index, (source, stamp) in enumerate(sources.items()):
+            target = os.path.join(generation, f'{index}_{os.path.basename(source)}')
+            if self.stamps.get(source) == stamp:
+                try:
+                    os.link(self.snapshot[source], target)
+                except OSError:
+                    shutil.copyfile(self.snapshot[source], target)
+            else:
+                src = sqlite3.connect(source)
+                dest = sqlite3.connect(target)
+                src.backup(dest, pages=REPLICA_BACKUP_PAGES, sleep=0.001)
+                dest.close()
+                src.close()
+            snapshot[source] = target
+        
+        self.snapshot, self.stamps, self.taken_at = snapshot, sources, taken_at
+        self.generations.append(generation)
+        while len(self.generations) > 2:
+            shutil.rmtree(self.generations.pop(0), ignore_errors=True)
+
+    def path_for(self, source):
+        """Return the snapshot of source, or None if it is missing or too stale"""
+        if self.max_staleness <= 0:
+            return None
+        if self.thread is None:
+            self.start()
+        if self.taken_at is None or time.monotonic() - self.taken_at > self.max_staleness:
+            return None
+        return self.snapshot.get(os.path.abspath(source))
+
+
+def file_stamp(path):
+    """Modification time and size of a database and its WAL, if any"""
+    stamp = []
+    for name in (path, path + '-wal'):
+        try:
+            st = os.stat(name)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
+
+
+def process_alive(pid):
+    """Whether a process with this pid still exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+replica = SnapshotReplica(
+    REPLICA_DIR, REPLICA_MAX_STALENESS,
+    lambda: [settings.DATABASES['default']['NAME']] + list(list_partitions(PARTITION_DIR).values())
+) if READ_REPLICA else None
+
+
+def read_alias(alias):
+    """Return the alias report queries on a database should use.
+
+    That is `replica:<alias>` while the replica holds a fresh enough snapshot
+    of it, else the database itself. Each replica alias keeps one settings
+    dict whose NAME is repointed at the newest snapshot; connections are
+    closed after every request, so the next request opens the new file.
+    """
+    snapshot = replica.path_for(connections.settings[alias]['NAME']) if replica else None
+    if snapshot is None:
+        return alias
+    
+    name = Path(snapshot).resolve().as_uri() + '?mode=ro&immutable=1'
+    replica_alias = f'replica:{alias}'
+    db = connections.settings.get(replica_alias)
+    if db is None:
+        connections.settings[replica_alias] = {**connections.settings[alias], 'NAME': name}
+    elif db['NAME'] != name:
+        db['NAME'] = name
+        connections[replica_alias].close()
+    return replica_alias
+
+
+def configure_replica_connection(sender, connection, **kwargs):
+    if connection.alias.startswith('replica:'):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA mmap_size = {REPLICA_MMAP_BYTES}')
+
+
+connection_created.connect(configure_replica_connection)
+
+# ============================================================================
+# ADMISSION CONTROL
+# ============================================================================
+
+class AdmissionGate:
+    """Bounded concurrency with a short wait queue for one endpoint"""
+
+    def __init__(self, concurrency, queue_size, wait_seconds):
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.queue_size = queue_size
+        self.wait_seconds = wait_seconds
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.slots.acquire(blocking=False):
+            return True
+        with self.lock:
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=self.wait_seconds)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def release(self):
+        self.slots.release()
+
+
+class RateLimiter:
+    """Per-client token buckets held in memory"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, client):
+        """Take one token; return 0 if allowed, else seconds until the next token"""
+        if self.rate <= 0:
+            return 0  # rate limiting disabled
+        now = time.monotonic()
+        with self.lock:
+            if len(self.buckets) > 10000:
+                self.prune(now)
+            tokens, last = self.buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self.buckets[client] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self.buckets[client] = (tokens - 1, now)
+            return 0
+
+    def prune(self, now):
+        # Buckets idle long enough to be full again carry no state
+        idle = self.burst / self.rate
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < idle}
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+
+def admission_controlled(view):
+    """Shed load for a view with 429 (client rate limit) or 503 (saturated)"""
+    gate = AdmissionGate(MAX_CONCURRENT_REQUESTS, ADMISSION_QUEUE_SIZE, ADMISSION_WAIT_SECONDS)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        wait = rate_limiter.take(request.META.get('REMOTE_ADDR'))
+        if wait:
+            response = error_response('Rate limit exceeded', 429)
+            response['Retry-After'] = str(math.ceil(wait))
+            return response
+        
+        if not gate.acquire():
+            response = error_response('Server busy, try again shortly', 503)
+            response['Retry-After'] = '1'
+            return response
+        
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            gate.release()
+            raise
+        
+        # Streamed bodies keep their slot until the stream is finished or closed
+        if response.streaming:
+            response.streaming_content = closing_stream(response.streaming_content, gate.release)
+        else:
+            gate.release()
+        return response
+    return wrapper
+
+
+def closing_stream(content, on_close):
+    """Yield a streamed body, then run on_close however the stream ends"""
+    try:
+        yield from content
+    finally:
+        on_close()
+
+# ============================================================================
+# IDEMPOTENCY
+# ============================================================================
+
+def is_ndjson_request(request):
+    return request.content_type in ('application/x-ndjson', 'application/jsonl')
+
+
+def idempotency_key(request):
+    """Return the dedup key for a submission, or None if it has none.
+
+    An Idempotency-Key header wins; otherwise a JSON body is keyed by the hash
+    of its canonical form. Streamed NDJSON bodies can only use the header.
+    """
+    header = request.headers.get('Idempotency-Key')
+    if header:
+        return f'{request.path}:key:{header}'
+    if is_ndjson_request(request) or int(request.META.get('CONTENT_LENGTH') or 0) > MAX_BILL_PAYLOAD_BYTES:
+        return None
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return None
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return f'{request.path}:sha256:{hashlib.sha256(canonical.encode()).hexdigest()}'
+
+
+last_idempotency_prune = 0
+
+
+def prune_idempotency_keys():
+    """Delete keys past IDEMPOTENCY_RETENTION, at most once a minute"""
+    global last_idempotency_prune
+    if time.monotonic() - last_idempotency_prune < 60:
+        return
+    last_idempotency_prune = time.monotonic()
+    cutoff = timezone.now() - timedelta(seconds=IDEMPOTENCY_RETENTION)
+    IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+
+
+def expired_idempotency_keys(now):
+    """Claims nobody finished within IDEMPOTENCY_CLAIM_TIMEOUT, or responses past IDEMPOTENCY_RETENTION"""
+    return (Q(created_at__lt=now - timedelta(seconds=IDEMPOTENCY_RETENTION)) |
+            Q(response__isnull=True, created_at__lt=now - timedelta(seconds=IDEMPOTENCY_CLAIM_TIMEOUT)))
+
+
+def claim_idempotency_key(key):
+    """Claim key for this request; return the stored record if already taken.
+
+    A repeat is answered from one primary-key lookup; the database is only
+    written when the key is new, or expired and taken over as if it were new.
+    """
+    for _ in range(3):
+        now = timezone.now()
+        stored = IdempotencyKey.objects.filter(key=key).annotate(
+            expired=models.ExpressionWrapper(expired_idempotency_keys(now), output_field=models.BooleanField())
+        ).first()
+        if stored is None:
+            try:
+                with transaction.atomic():
+                    IdempotencyKey.objects.create(key=key)
+                return None
+            except IntegrityError:
+                continue  # Claimed by another request since the lookup
+        
+        if not stored.expired:
+            return stored
+        
+        if IdempotencyKey.objects.filter(expired_idempotency_keys(now), key=key).update(
+                status=None, response=None, created_at=now):
+            return None
+        # Taken over by another request since the lookup
+    return IdempotencyKey(key=key)
+
+
+def finish_idempotency_key(key, status, body):
+    """Store the response for a claimed key, or release the claim if body is None"""
+    if body is None:
+        IdempotencyKey.objects.filter(key=key).delete()
+    else:
+        IdempotencyKey.objects.filter(key=key).update(status=status, response=body)
+    # Old keys are cleared after a write rather than on every claim
+    prune_idempotency_keys()
+
+
+def idempotent(view):
+    """Replay the stored response for a repeated submission instead of re-running it"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = idempotency_key(request)
+        if key is None:
+            return view(request, *args, **kwargs)
+        
+        stored = claim_idempotency_key(key)
+        if stored:
+            if stored.response is None:
+                response = error_response('A request with this key is still in progress', 409)
+                response['Retry-After'] = '1'
+                return response
+            content_type = 'application/x-ndjson' if is_ndjson_request(request) else 'application/json'
+            response = HttpResponse(stored.response, status=stored.status, content_type=content_type)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            finish_idempotency_key(key, None, None)
+            raise
+        
+        if response.status_code >= 300:
+            finish_idempotency_key(key, None, None)
+        elif response.streaming:
+            # Streamed bills are stored by their summary line once the stream closes
+            tail = []
+            response.streaming_content = closing_stream(
+                remember_last_line(response.streaming_content, tail),
+                lambda: finish_streamed_key(key, response.status_code, tail))
+        else:
+            finish_idempotency_key(key, response.status_code, response.content.decode())
+        return response
+    return wrapper
+
+
+def remember_last_line(lines, tail):
+    for line in lines:
+        tail[:] = [line]
+        yield line
+
+
+def finish_streamed_key(key, status, tail):
+    last = tail[0] if tail else None
+    if isinstance(last, bytes):
+        last = last.decode()
+    try:
+        succeeded = last is not None and json.loads(last).get('success')
+    except ValueError:
+        succeeded = False
+    finish_idempotency_key(key, status, last if succeeded else None)
+
 # ============================================================================
 # API VIEWS
 # ============================================================================
@@ -196,6 +823,7 @@ def search_item(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
+@admission_controlled
 def check_price(request):
     """Check if price is within government limits"""
     try:
@@ -232,14 +860,16 @@ def check_price(request):
         
         # Save to database if requested
         if save_to_db:
-            Bill.objects.create(
-                patient_name='Quick Check',
-                hospital_name='Price Verification',
-                bill_date=datetime.now().date(),
-                total_amount=charged_price,
-                verified=True,
-                overcharged=not is_valid
-            )
+            bill_date = datetime.now().date()
+            with write_partition(bill_date) as alias:
+                Bill.objects.using(alias).create(
+                    patient_name='Quick Check',
+                    hospital_name='Price Verification',
+                    bill_date=bill_date,
+                    total_amount=charged_price,
+                    verified=True,
+                    overcharged=not is_valid
+                )
         
         return json_response(result)
         
@@ -247,10 +877,57 @@ def check_price(request):
         return error_response(str(e))
 
 
+def verify_item(item_data):
+    """Look up one bill item and compare it with government limits"""
+    item_name = item_data['name']
+    item_type = item_data['type']
+    charged_price = Decimal(str(item_data['price']))
+    
+    # Find item in database
+    if item_type == 'medicine':
+        db_item = Medicine.objects.filter(name__icontains=item_name).first()
+    else:
+        db_item = Procedure.objects.filter(name__icontains=item_name).first()
+    
+    if db_item is None:
+        return charged_price, None
+    
+    is_valid = db_item.govt_min_price <= charged_price <= db_item.govt_max_price
+    return charged_price, {
+        'item_id': db_item.id,
+        'item_name': db_item.name,
+        'item_type': item_type,
+        'charged_price': charged_price,
+        'govt_max_price': db_item.govt_max_price,
+        'is_overcharged': not is_valid
+    }
+
+
+def create_bill_item(bill, item):
+    return BillItem.objects.using(bill._state.db).create(
+        bill=bill,
+        item_type=item['item_type'],
+        item_id=item['item_id'],
+        item_name=item['item_name'],
+        charged_price=item['charged_price'],
+        govt_max_price=item['govt_max_price'],
+        is_overcharged=item['is_overcharged']
+    )
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
+@admission_controlled
+@idempotent
 def verify_bill(request):
     """Verify complete bill with multiple items"""
+    content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+    if content_length > MAX_BILL_PAYLOAD_BYTES:
+        return error_response(f'Payload exceeds {MAX_BILL_PAYLOAD_BYTES} bytes', 413)
+    
+    if is_ndjson_request(request):
+        return verify_bill_stream(request)
+    
     try:
         data = json.loads(request.body)
         patient_name = data.get('patient_name')
@@ -261,60 +938,38 @@ def verify_bill(request):
         if not all([patient_name, hospital_name, bill_date, items]):
             return error_response('Missing required fields')
         
+        if len(items) > MAX_BILL_ITEMS:
+            return error_response(f'Bill exceeds {MAX_BILL_ITEMS} items', 413)
+        
+        bill_date = datetime.strptime(bill_date, '%Y-%m-%d').date()
+        
         # Verify each item
         verified_items = []
         total_amount = Decimal('0')
         has_overcharge = False
         
         for item_data in items:
-            item_name = item_data['name']
-            item_type = item_data['type']
-            charged_price = Decimal(str(item_data['price']))
+            charged_price, item = verify_item(item_data)
             total_amount += charged_price
             
-            # Find item in database
-            if item_type == 'medicine':
-                db_items = Medicine.objects.filter(name__icontains=item_name)
-            else:
-                db_items = Procedure.objects.filter(name__icontains=item_name)
-            
-            if db_items.exists():
-                db_item = db_items.first()
-                is_valid = db_item.govt_min_price <= charged_price <= db_item.govt_max_price
-                
-                if not is_valid:
+            if item:
+                if item['is_overcharged']:
                     has_overcharge = True
-                
-                verified_items.append({
-                    'item_id': db_item.id,
-                    'item_name': db_item.name,
-                    'item_type': item_type,
-                    'charged_price': charged_price,
-                    'govt_max_price': db_item.govt_max_price,
-                    'is_overcharged': not is_valid
-                })
-        
-        # Create bill
-        bill = Bill.objects.create(
-            patient_name=patient_name,
-            hospital_name=hospital_name,
-            bill_date=bill_date,
-            total_amount=total_amount,
-            verified=True,
-            overcharged=has_overcharge
-        )
-        
-        # Create bill items
-        for item in verified_items:
-            BillItem.objects.create(
-                bill=bill,
-                item_type=item['item_type'],
-                item_id=item['item_id'],
-                item_name=item['item_name'],
-                charged_price=item['charged_price'],
-                govt_max_price=item['govt_max_price'],
-                is_overcharged=item['is_overcharged']
+                verified_items.append(item)
+        
+        # Create bill and its items in the bill month's partition
+        with write_partition(bill_date) as alias, transaction.atomic(using=alias):
+            bill = Bill.objects.using(alias).create(
+                patient_name=patient_name,
+                hospital_name=hospital_name,
+                bill_date=bill_date,
+                total_amount=total_amount,
+                verified=True,
+                overcharged=has_overcharge
             )
+            
+            for item in verified_items:
+                create_bill_item(bill, item)
         
         return json_response({
             'success': True,
@@ -326,11 +981,119 @@ def verify_bill(request):
         return error_response(str(e))
 
 
+def verify_bill_stream(request):
+    """Verify an NDJSON bill body line by line.
+
+    The first line holds the bill header (patient_name, hospital_name,
+    bill_date); every following line is one item (name, type, price).
+    One result line is streamed back per item, followed by a summary line.
+    """
+    def read_lines():
+        remaining = MAX_BILL_PAYLOAD_BYTES
+        while True:
+            line = request.readline(remaining + 1)
+            if not line:
+                return
+            remaining -= len(line)
+            if remaining < 0:
+                raise RequestDataTooBig(f'Payload exceeds {MAX_BILL_PAYLOAD_BYTES} bytes')
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    
+    # The header is checked before streaming starts so a bad one gets a 4xx
+    lines = read_lines()
+    try:
+        header = next(lines, None)
+    except RequestDataTooBig as e:
+        return error_response(str(e), 413)
+    except ValueError:
+        return error_response('First line must be a JSON object')
+    if not isinstance(header, dict) or not all(header.get(k) for k in ('patient_name', 'hospital_name', 'bill_date')):
+        return error_response('First line must contain patient_name, hospital_name and bill_date')
+    try:
+        bill_date = datetime.strptime(str(header['bill_date']), '%Y-%m-%d').date()
+    except ValueError:
+        return error_response('bill_date must be YYYY-MM-DD')
+    
+    def generate():
+        try:
+            # Nothing is written until the whole body has been read, so a
+            # slow upload does not hold the partition's write lock
+            total_amount = Decimal('0')
+            has_overcharge = False
+            verified_items = []
+            count = 0
+            for item_data in lines:
+                count += 1
+                if count > MAX_BILL_ITEMS:
+                    raise ValueError(f'Bill exceeds {MAX_BILL_ITEMS} items')
+                if not isinstance(item_data, dict):
+                    raise ValueError(f'Item {count} must be a JSON object')
+                
+                charged_price, item = verify_item(item_data)
+                total_amount += charged_price
+                
+                if item:
+                    if item['is_overcharged']:
+                        has_overcharge = True
+                    verified_items.append(item)
+                
+                yield json.dumps({
+                    'line': count,
+                    'name': item_data['name'],
+                    'found': item is not None,
+                    'charged_price': float(charged_price),
+                    'govt_max_price': float(item['govt_max_price']) if item else None,
+                    'is_overcharged': bool(item and item['is_overcharged'])
+                }) + '\n'
+            
+            with write_partition(bill_date) as alias, transaction.atomic(using=alias):
+                bill = Bill.objects.using(alias).create(
+                    patient_name=header['patient_name'],
+                    hospital_name=header['hospital_name'],
+                    bill_date=bill_date,
+                    total_amount=total_amount,
+                    verified=True,
+                    overcharged=has_overcharge
+                )
+                for item in verified_items:
+                    create_bill_item(bill, item)
+            
+            yield json.dumps({
+                'success': True,
+                'bill_id': bill.id,
+                'items': count,
+                'total_amount': float(total_amount),
+                'overcharged': has_overcharge
+            }) + '\n'
+        except Exception as e:
+            yield json.dumps({'success': False, 'error': str(e)}) + '\n'
+    
+    return StreamingHttpResponse(generate(), content_type='application/x-ndjson')
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_bills(request):
-    """Get all verified bills"""
-    bills = Bill.objects.all()
+    """Get verified bills, optionally for a bill_date range (?from=&to=)"""
+    try:
+        date_from = request.GET.get('from')
+        date_to = request.GET.get('to')
+        date_from = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+        date_to = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+    except ValueError:
+        return error_response('from/to must be YYYY-MM-DD')
+    
+    bills = []
+    for alias in read_partitions(date_from, date_to):
+        queryset = Bill.objects.using(read_alias(alias))
+        if date_from:
+            queryset = queryset.filter(bill_date__gte=date_from)
+        if date_to:
+            queryset = queryset.filter(bill_date__lte=date_to)
+        bills.extend(queryset)
+    bills.sort(key=lambda bill: bill.created_at, reverse=True)
     return json_response([bill.to_dict() for bill in bills])
 
 
@@ -339,8 +1102,15 @@ def get_bills(request):
 def get_bill_details(request, bill_id):
     """Get bill with all items"""
     try:
-        bill = Bill.objects.get(id=bill_id)
-        items = BillItem.objects.filter(bill=bill)
+        alias = bill_partition(bill_id)
+        if alias is None:
+            raise Bill.DoesNotExist
+        try:
+            bill = Bill.objects.using(read_alias(alias)).get(id=bill_id)
+        except Bill.DoesNotExist:
+            # Bills newer than the replica snapshot are only on the primary
+            bill = Bill.objects.using(alias).get(id=bill_id)
+        items = BillItem.objects.using(bill._state.db).filter(bill=bill)
         
         return json_response({
             'bill': bill.to_dict(),
@@ -354,8 +1124,17 @@ def get_bill_details(request, bill_id):
 @require_http_methods(["GET"])
 def dashboard_stats(request):
     """Get dashboard statistics"""
-    total_bills = Bill.objects.count()
-    overcharged_bills = Bill.objects.filter(overcharged=True).count()
+    total_bills = 0
+    overcharged_bills = 0
+    for alias in read_partitions():
+        bills = Bill.objects.using(read_alias(alias))
+        total_bills += bills.count()
+        overcharged_bills += bills.filter(overcharged=True).count()
+    
+    # Archived months are counted from the summary taken when they were archived
+    for summary in BillArchive.objects.using(read_alias('default')):
+        total_bills += summary.total_bills
+        overcharged_bills += summary.overcharged_bills
     valid_bills = total_bills - overcharged_bills
     
     return json_response({
@@ -375,8 +1154,8 @@ def home(request):
             'GET /api/procedures/': 'Get all procedures',
             'GET /api/search/?q=name&type=medicine': 'Search items',
             'POST /api/check-price/': 'Check single price',
-            'POST /api/verify-bill/': 'Verify complete bill',
-            'GET /api/bills/': 'Get all bills',
+            'POST /api/verify-bill/': 'Verify complete bill (JSON or NDJSON stream)',
+            'GET /api/bills/?from=YYYY-MM-DD&to=YYYY-MM-DD': 'Get bills (optional bill_date range)',
             'GET /api/bills/<id>/': 'Get bill details',
             'GET /api/stats/': 'Get dashboard statistics'
         }
@@ -398,23 +1177,98 @@ urlpatterns = [
     path('api/stats/', dashboard_stats),
 ]
 
-application = get_wsgi_application()
+wsgi_handler = None
+wsgi_lock = threading.Lock()
+
+
+def get_application():
+    """Build the WSGI handler on first use, checking the schema once"""
+    global wsgi_handler
+    if wsgi_handler is None:
+        with wsgi_lock:
+            if wsgi_handler is None:
+                from django.core.wsgi import get_wsgi_application
+                ensure_schema()
+                wsgi_handler = get_wsgi_application()
+    return wsgi_handler
+
+
+def application(environ, start_response):
+    """WSGI entry point (gunicorn backend:application)"""
+    return get_application()(environ, start_response)
 
 # ============================================================================
 # DATABASE INITIALIZATION
 # ============================================================================
 
+MAIN_MODELS = [Medicine, Procedure, Bill, BillItem, BillArchive, IdempotencyKey]
+PARTITION_MODELS = [Bill, BillItem]
+
+
+def ensure_schema(using='default', schema_models=MAIN_MODELS, sequences=None):
+    """Create missing tables and columns; return the names of the tables created.
+
+    Safe to run on every start: once a database is current its PRAGMA
+    user_version is SCHEMA_VERSION and the check is a single pragma read.
+    Otherwise the check, the DDL and the AUTOINCREMENT floors in sequences
+    ({table: first id - 1}) commit together under BEGIN IMMEDIATE, so workers
+    starting at once wait for each other instead of creating a table twice.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA user_version')
+        if cursor.fetchone()[0] == SCHEMA_VERSION:
+            return []
+        # The schema editor needs foreign keys off, which SQLite only allows outside a transaction
+        cursor.execute('PRAGMA foreign_keys = OFF')
+        cursor.execute('BEGIN IMMEDIATE')
+    
+    created = []
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA user_version')
+            current = cursor.fetchone()[0] == SCHEMA_VERSION
+        
+        if not current:
+            tables = connection.introspection.table_names()
+            with connection.schema_editor(atomic=False) as schema_editor:
+                for model in schema_models:
+                    table = model._meta.db_table
+                    if table not in tables:
+                        schema_editor.create_model(model)
+                        created.append(table)
+                        continue
+                    
+                    with connection.cursor() as cursor:
+                        columns = {c.name for c in connection.introspection.get_table_description(cursor, table)}
+                    for field in model._meta.local_fields:
+                        if field.column not in columns:
+                            schema_editor.add_field(model, field)
+            
+            with connection.cursor() as cursor:
+                for table, seq in (sequences or {}).items():
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                                   'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)',
+                                   [table, seq, table])
+                    cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s AND seq < %s',
+                                   [seq, table, seq])
+                cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        
+        with connection.cursor() as cursor:
+            cursor.execute('COMMIT')
+    except BaseException:
+        with connection.cursor() as cursor:
+            cursor.execute('ROLLBACK')
+        raise
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA foreign_keys = ON')
+    return created
+
+
 def init_database():
     """Initialize database with tables and sample data"""
-    from django.core.management import call_command
-    from django.db import connection
-    
-    # Create tables
-    with connection.schema_editor() as schema_editor:
-        schema_editor.create_model(Medicine)
-        schema_editor.create_model(Procedure)
-        schema_editor.create_model(Bill)
-        schema_editor.create_model(BillItem)
+    ensure_schema()
     
     # Add sample data
     if not Medicine.objects.exists():
@@ -439,17 +1293,50 @@ def init_database():
     
     print("✅ Database initialized with sample data")
 
+# ============================================================================
+# STARTUP BENCHMARK
+# ============================================================================
+
+def benchmark_startup(runs=10):
+    """Time fresh interpreters importing this module and building the WSGI app"""
+    import statistics
+    import subprocess
+    import sys
+    
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    code = 'import backend; backend.get_application()'
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], env=env, check=True)
+        timings.append(time.perf_counter() - start)
+    
+    print(f"⏱️  Cold start over {runs} runs: "
+          f"min {min(timings) * 1000:.0f} ms, "
+          f"median {statistics.median(timings) * 1000:.0f} ms, "
+          f"max {max(timings) * 1000:.0f} ms")
+    return timings
+
 # ============================================================================
 # MAIN EXECUTION
 # ============================================================================
 
 if __name__ == '__main__':
     import sys
+    from django.core.management import execute_from_command_line
     
     if len(sys.argv) > 1:
         if sys.argv[1] == 'init':
             init_database()
+        elif sys.argv[1] == 'archive':
+            ensure_schema()
+            months = int(sys.argv[2]) if len(sys.argv) > 2 else ARCHIVE_AFTER_MONTHS
+            archived = archive_partitions(months)
+            print(f"✅ Archived {len(archived)} partition(s): {', '.join(map(partition_file, archived)) or 'none'}")
+        elif sys.argv[1] == 'benchstartup':
+            benchmark_startup(int(sys.argv[2]) if len(sys.argv) > 2 else 10)
         elif sys.argv[1] == 'runserver':
+            ensure_schema()
             port = sys.argv[2] if len(sys.argv) > 2 else '8000'
             print(f"🚀 Starting server on http://127.0.0.1:{port}")
             execute_from_command_line(['manage.py', 'runserver', port])
@@ -460,3 +1347,5 @@ if __name__ == '__main__':
         print("  python backend.py init          - Initialize database")
         print("  python backend.py runserver     - Start server (default port 8000)")
         print("  python backend.py runserver 8080 - Start server on custom port")
+        print(f"  python backend.py archive [n]   - Archive bill partitions older than n months (default {ARCHIVE_AFTER_MONTHS})")
+        print("  python backend.py benchstartup [runs] - Measure cold start time")
@@ -3,21 +3,191 @@ Smart Healthcare Billing - Simple Flask Backend
 Run: python server.py
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+import os
+import re
+import math
+import hashlib
+import shutil
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from functools import wraps
+from pathlib import Path
 import json
 
+try:
+    import fcntl
+except ImportError:  # Windows: partition locks then only cover this process
+    fcntl = None
+
 app = Flask(__name__)
 CORS(app)
 
 DB_NAME = 'healthcare.db'
 
+# Limits for POST /api/verify-bill (JSON and NDJSON bodies)
+MAX_BILL_PAYLOAD_BYTES = int(os.environ.get('MAX_BILL_PAYLOAD_BYTES', 5 * 1024 * 1024))
+MAX_BILL_ITEMS = int(os.environ.get('MAX_BILL_ITEMS', 1000))
+# Also caps bodies sent without Content-Length (chunked)
+app.config['MAX_CONTENT_LENGTH'] = MAX_BILL_PAYLOAD_BYTES
+
+# Admission control for POST /api/check-price and /api/verify-bill
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 8))
+ADMISSION_QUEUE_SIZE = int(os.environ.get('ADMISSION_QUEUE_SIZE', 16))
+ADMISSION_WAIT_SECONDS = float(os.environ.get('ADMISSION_WAIT_SECONDS', 0.5))
+# RATE_LIMIT_PER_SECOND=0 turns per-client rate limiting off
+RATE_LIMIT_PER_SECOND = float(os.environ.get('RATE_LIMIT_PER_SECOND', 5))
+RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 20))
+
+# Monthly bill partitions: bills/bill_items live in one SQLite file per bill_date month
+PARTITION_DIR = os.environ.get('PARTITION_DIR', 'partitions')
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', os.path.join(PARTITION_DIR, 'archive'))
+ARCHIVE_AFTER_MONTHS = int(os.environ.get('ARCHIVE_AFTER_MONTHS', 6))
+# Bill ids in a partition start at YYYYMM * BILL_ID_STRIDE, so an id names its month
+BILL_ID_STRIDE = 10 ** 7
+
+# Idempotent submissions: a claim with no response after IDEMPOTENCY_CLAIM_TIMEOUT
+# seconds is taken as abandoned; stored responses are replayed for IDEMPOTENCY_RETENTION
+IDEMPOTENCY_CLAIM_TIMEOUT = int(os.environ.get('IDEMPOTENCY_CLAIM_TIMEOUT', 300))
+IDEMPOTENCY_RETENTION = int(os.environ.get('IDEMPOTENCY_RETENTION', 24 * 3600))
+
+# Optional read replica: report endpoints read a read-only snapshot of the databases
+READ_REPLICA = os.environ.get('READ_REPLICA', '') == '1'
+REPLICA_DIR = os.environ.get('REPLICA_DIR', 'replica')
+REPLICA_MAX_STALENESS = float(os.environ.get('REPLICA_MAX_STALENESS', 5))
+REPLICA_MMAP_BYTES = int(os.environ.get('REPLICA_MMAP_BYTES', 256 * 1024 * 1024))
+REPLICA_BACKUP_PAGES = int(os.environ.get('REPLICA_BACKUP_PAGES', 1024))
+
+# ============================================================================
+# ADMISSION CONTROL
+# ============================================================================
+
+class AdmissionGate:
+    """Bounded concurrency with a short wait queue for one endpoint"""
+
+    def __init__(self, concurrency, queue_size, wait_seconds):
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.queue_size = queue_size
+        self.wait_seconds = wait_seconds
+        self.waiting = 0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.slots.acquire(blocking=False):
+            return True
+        with self.lock:
+            if self.waiting >= self.queue_size:
+                return False
+            self.waiting += 1
+        try:
+            return self.slots.acquire(timeout=self.wait_seconds)
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def release(self):
+        self.slots.release()
+
+
+class RateLimiter:
+    """Per-client token buckets held in memory"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, client):
+        """Take one token; return 0 if allowed, else seconds until the next token"""
+        if self.rate <= 0:
+            return 0  # rate limiting disabled
+        now = time.monotonic()
+        with self.lock:
+            if len(self.buckets) > 10000:
+                self.prune(now)
+            tokens, last = self.buckets.get(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                self.buckets[client] = (tokens, now)
+                return (1 - tokens) / self.rate
+            self.buckets[client] = (tokens - 1, now)
+            return 0
+
+    def prune(self, now):
+        # Buckets idle long enough to be full again carry no state
+        idle = self.burst / self.rate
+        self.buckets = {k: v for k, v in self.buckets.items() if now - v[1] < idle}
+
+
+rate_limiter = RateLimiter(RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+
+def admission_controlled(f):
+    """Shed load for an endpoint with 429 (client rate limit) or 503 (saturated)"""
+    gate = AdmissionGate(MAX_CONCURRENT_REQUESTS, ADMISSION_QUEUE_SIZE, ADMISSION_WAIT_SECONDS)
+
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        wait = rate_limiter.take(request.remote_addr)
+        if wait:
+            response = jsonify({'error': 'Rate limit exceeded'})
+            response.headers['Retry-After'] = str(math.ceil(wait))
+            return response, 429
+        
+        if not gate.acquire():
+            response = jsonify({'error': 'Server busy, try again shortly'})
+            response.headers['Retry-After'] = '1'
+            return response, 503
+        
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except BaseException:
+            gate.release()
+            raise
+        
+        # Streamed bodies keep their slot until the last line is sent
+        if response.is_streamed:
+            response.call_on_close(gate.release)
+        else:
+            gate.release()
+        return response
+    return wrapper
+
 # ============================================================================
 # DATABASE SETUP
 # ============================================================================
 
+# Shared by the main database (bills written before partitioning) and every
+# monthly partition; {db} is the schema name the tables are created in.
+BILL_SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS {db}.bills (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        patient_name TEXT NOT NULL,
+        hospital_name TEXT NOT NULL,
+        bill_date TEXT NOT NULL,
+        total_amount REAL NOT NULL,
+        verified INTEGER DEFAULT 1,
+        overcharged INTEGER DEFAULT 0,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''',
+    '''CREATE TABLE IF NOT EXISTS {db}.bill_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        bill_id INTEGER,
+        item_type TEXT NOT NULL,
+        item_id INTEGER NOT NULL,
+        item_name TEXT NOT NULL,
+        charged_price REAL NOT NULL,
+        govt_max_price REAL NOT NULL,
+        is_overcharged INTEGER DEFAULT 0,
+        FOREIGN KEY (bill_id) REFERENCES bills(id)
+    )''',
+]
+
 def init_db():
     conn = sqlite3.connect(DB_NAME)
     c = conn.cursor()
@@ -40,28 +210,8 @@ def init_db():
         govt_max_price REAL NOT NULL
     )''')
     
-    c.execute('''CREATE TABLE IF NOT EXISTS bills (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        patient_name TEXT NOT NULL,
-        hospital_name TEXT NOT NULL,
-        bill_date TEXT NOT NULL,
-        total_amount REAL NOT NULL,
-        verified INTEGER DEFAULT 1,
-        overcharged INTEGER DEFAULT 0,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
-    )''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS bill_items (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        bill_id INTEGER,
-        item_type TEXT NOT NULL,
-        item_id INTEGER NOT NULL,
-        item_name TEXT NOT NULL,
-        charged_price REAL NOT NULL,
-        govt_max_price REAL NOT NULL,
-        is_overcharged INTEGER DEFAULT 0,
-        FOREIGN KEY (bill_id) REFERENCES bills(id)
-    )''')
+    for sql in BILL_SCHEMA:
+        c.execute(sql.format(db='main'))
     
     c.execute('''CREATE TABLE IF NOT EXISTS complaints (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -77,6 +227,22 @@ def init_db():
         FOREIGN KEY (bill_id) REFERENCES bills(id)
     )''')
     
+    # One row per submission; the primary key is the dedup index
+    c.execute('''CREATE TABLE IF NOT EXISTS idempotency_keys (
+        key TEXT PRIMARY KEY,
+        status INTEGER,
+        response TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_created_at ON idempotency_keys (created_at)')
+    
+    c.execute('''CREATE TABLE IF NOT EXISTS bill_archive (
+        month INTEGER PRIMARY KEY,
+        total_bills INTEGER NOT NULL,
+        overcharged_bills INTEGER NOT NULL,
+        archived_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+    
     # Insert sample data if empty
     c.execute('SELECT COUNT(*) FROM medicines')
     if c.fetchone()[0] == 0:
@@ -104,6 +270,397 @@ def init_db():
     conn.close()
     print("✅ Database initialized")
 
+# ============================================================================
+# BILL PARTITIONS
+# ============================================================================
+
+PARTITION_FILE = re.compile(r'^bills_(\d{4})_(\d{2})\.db$')
+process_partition_lock = threading.Lock()
+
+def month_key(bill_date):
+    """Return the YYYYMM partition key for an ISO date (YYYY-MM-DD)"""
+    d = datetime.strptime(str(bill_date)[:10], '%Y-%m-%d')
+    return d.year * 100 + d.month
+
+def partition_file(key):
+    return f'bills_{key // 100:04d}_{key % 100:02d}.db'
+
+def list_partitions(directory):
+    """Return {month key: path} for the partition files in a directory"""
+    if not os.path.isdir(directory):
+        return {}
+    partitions = {}
+    for name in os.listdir(directory):
+        match = PARTITION_FILE.match(name)
+        if match:
+            partitions[int(match.group(1)) * 100 + int(match.group(2))] = os.path.join(directory, name)
+    return partitions
+
+@contextmanager
+def partition_lock(key):
+    """Hold the exclusive lock of one month partition.
+
+    The lock is an flock on a file next to the partition, so it also keeps
+    the archive command (a separate process) away from a month being written.
+    """
+    os.makedirs(PARTITION_DIR, exist_ok=True)
+    with open(os.path.join(PARTITION_DIR, partition_file(key) + '.lock'), 'a') as lock_file:
+        if fcntl is None:
+            with process_partition_lock:
+                yield
+        else:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)  # released when the file closes
+            yield
+
+@contextmanager
+def attach_partition(conn, bill_date):
+    """Attach the partition for bill_date to conn as `part`, creating it if needed.
+
+    The partition stays locked until the block ends, so callers commit their
+    writes inside it. Writing to an archived month moves its file back into
+    the hot set.
+    """
+    key = month_key(bill_date)
+    path = os.path.join(PARTITION_DIR, partition_file(key))
+    archived = os.path.join(ARCHIVE_DIR, partition_file(key))
+    
+    with partition_lock(key):
+        if not os.path.exists(path) and os.path.exists(archived):
+            os.replace(archived, path)
+            conn.execute('DELETE FROM bill_archive WHERE month = ?', (key,))
+            conn.commit()
+        
+        conn.execute('ATTACH DATABASE ? AS part', (path,))
+        for sql in BILL_SCHEMA:
+            conn.execute(sql.format(db='part'))
+        conn.execute('''INSERT INTO part.sqlite_sequence (name, seq)
+                        SELECT 'bills', ? WHERE NOT EXISTS
+                        (SELECT 1 FROM part.sqlite_sequence WHERE name = 'bills')''',
+                     (key * BILL_ID_STRIDE,))
+        conn.commit()
+        yield
+
+def bill_partitions(date_from=None, date_to=None):
+    """Return the database paths holding bills in a bill_date range.
+
+    Without a range only the hot partitions are read; archived months are
+    included when a range touches them. The main database is always included
+    for bills stored before partitioning.
+    """
+    partitions = list_partitions(PARTITION_DIR)
+    if date_from or date_to:
+        partitions = {**list_partitions(ARCHIVE_DIR), **partitions}
+        low = month_key(date_from) if date_from else 0
+        high = month_key(date_to) if date_to else 999999
+        partitions = {k: v for k, v in partitions.items() if low <= k <= high}
+    return [DB_NAME] + [partitions[k] for k in sorted(partitions, reverse=True)]
+
+def archive_partitions(older_than_months=ARCHIVE_AFTER_MONTHS):
+    """Compact hot partitions older than the cutoff into ARCHIVE_DIR"""
+    today = datetime.now().date()
+    months = today.year * 12 + today.month - 1 - older_than_months
+    cutoff = (months // 12) * 100 + months % 12 + 1
+    
+    conn = sqlite3.connect(DB_NAME)
+    archived = []
+    for key in sorted(list_partitions(PARTITION_DIR)):
+        if key >= cutoff:
+            continue
+        
+        # Writers hold this lock until they commit, so no bill lands between
+        # the copy and the removal, and a restore waits for the summary row
+        with partition_lock(key):
+            path = os.path.join(PARTITION_DIR, partition_file(key))
+            dest = os.path.join(ARCHIVE_DIR, partition_file(key))
+            if not os.path.exists(path):
+                continue
+            if os.path.exists(dest):
+                print(f"⚠️  Skipping {partition_file(key)}: already archived")
+                continue
+            
+            os.makedirs(ARCHIVE_DIR, exist_ok=True)
+            part = sqlite3.connect(path)
+            total, overcharged = part.execute(
+                'SELECT COUNT(*), COALESCE(SUM(overcharged), 0) FROM bills').fetchone()
+            part.execute('VACUUM INTO ?', (dest,))
+            part.close()
+            os.remove(path)
+            
+            conn.execute('INSERT OR REPLACE INTO bill_archive (month, total_bills, overcharged_bills) VALUES (?, ?, ?)',
+                         (key, total, overcharged))
+            conn.commit()
+            archived.append(key)
+    conn.close()
+    return archived
+
+# ============================================================================
+# IDEMPOTENCY
+# ============================================================================
+
+def idempotency_key():
+    """Return the dedup key for this submission, or None if it has none.
+
+    An Idempotency-Key header wins; otherwise a JSON body is keyed by the hash
+    of its canonical form. Streamed NDJSON bodies can only use the header.
+    """
+    header = request.headers.get('Idempotency-Key')
+    if header:
+        return f'{request.path}:key:{header}'
+    if is_ndjson_request() or (request.content_length or 0) > MAX_BILL_PAYLOAD_BYTES:
+        return None
+    data = request.get_json(silent=True)
+    if data is None:
+        return None
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return f'{request.path}:sha256:{hashlib.sha256(canonical.encode()).hexdigest()}'
+
+last_idempotency_prune = 0
+
+def prune_idempotency_keys(conn):
+    """Delete keys past IDEMPOTENCY_RETENTION, at most once a minute"""
+    global last_idempotency_prune
+    if time.monotonic() - last_idempotency_prune < 60:
+        return
+    last_idempotency_prune = time.monotonic()
+    conn.execute("DELETE FROM idempotency_keys WHERE created_at < datetime('now', ?)",
+                 (f'-{IDEMPOTENCY_RETENTION} seconds',))
+
+# A claim nobody finished within IDEMPOTENCY_CLAIM_TIMEOUT, or a response past IDEMPOTENCY_RETENTION
+EXPIRED_IDEMPOTENCY_KEY = """(created_at < datetime('now', ?)
+                              OR (response IS NULL AND created_at < datetime('now', ?)))"""
+
+def claim_idempotency_key(key):
+    """Claim key for this request; return the stored (status, response) if already taken.
+
+    A repeat is answered from one primary-key lookup; the database is only
+    written when the key is new, or expired and taken over as if it were new.
+    """
+    expiry = (f'-{IDEMPOTENCY_RETENTION} seconds', f'-{IDEMPOTENCY_CLAIM_TIMEOUT} seconds')
+    conn = sqlite3.connect(DB_NAME)
+    try:
+        for _ in range(3):
+            stored = conn.execute(f'SELECT status, response, {EXPIRED_IDEMPOTENCY_KEY} FROM idempotency_keys WHERE key = ?',
+                                  (*expiry, key)).fetchone()
+            if stored is None:
+                try:
+                    conn.execute('INSERT INTO idempotency_keys (key) VALUES (?)', (key,))
+                    conn.commit()
+                    return None
+                except sqlite3.IntegrityError:
+                    continue  # Claimed by another request since the lookup
+            
+            if not stored[2]:
+                return stored[:2]
+            
+            c = conn.execute(f'''UPDATE idempotency_keys
+                                 SET status = NULL, response = NULL, created_at = CURRENT_TIMESTAMP
+                                 WHERE key = ? AND {EXPIRED_IDEMPOTENCY_KEY}''', (key, *expiry))
+            conn.commit()
+            if c.rowcount:
+                return None
+            # Taken over by another request since the lookup
+        return (None, None)
+    finally:
+        conn.close()
+
+def finish_idempotency_key(key, status, body):
+    """Store the response for a claimed key, or release the claim if body is None"""
+    conn = sqlite3.connect(DB_NAME)
+    if body is None:
+        conn.execute('DELETE FROM idempotency_keys WHERE key = ?', (key,))
+    else:
+        conn.execute('UPDATE idempotency_keys SET status = ?, response = ? WHERE key = ?', (status, body, key))
+    # Already holding the write lock, so old keys are cleared here rather than on every claim
+    prune_idempotency_keys(conn)
+    conn.commit()
+    conn.close()
+
+def idempotent(f):
+    """Replay the stored response for a repeated submission instead of re-running it"""
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        key = idempotency_key()
+        if key is None:
+            return f(*args, **kwargs)
+        
+        stored = claim_idempotency_key(key)
+        if stored:
+            status, body = stored
+            if body is None:
+                response = jsonify({'error': 'A request with this key is still in progress'})
+                response.headers['Retry-After'] = '1'
+                return response, 409
+            mimetype = 'application/x-ndjson' if is_ndjson_request() else 'application/json'
+            return Response(body, status=status, mimetype=mimetype, headers={'Idempotent-Replayed': 'true'})
+        
+        try:
+            response = app.make_response(f(*args, **kwargs))
+        except BaseException:
+            finish_idempotency_key(key, None, None)
+            raise
+        
+        if response.status_code >= 300:
+            finish_idempotency_key(key, None, None)
+        elif response.is_streamed:
+            # Streamed bills are stored by their summary line once the stream closes
+            tail = []
+            response.response = remember_last_line(response.response, tail)
+            response.call_on_close(lambda: finish_streamed_key(key, response.status_code, tail))
+        else:
+            finish_idempotency_key(key, response.status_code, response.get_data(as_text=True))
+        return response
+    return wrapper
+
+def remember_last_line(lines, tail):
+    for line in lines:
+        tail[:] = [line]
+        yield line
+
+def finish_streamed_key(key, status, tail):
+    last = tail[0] if tail else None
+    if isinstance(last, bytes):
+        last = last.decode()
+    try:
+        succeeded = last is not None and json.loads(last).get('success')
+    except ValueError:
+        succeeded = False
+    finish_idempotency_key(key, status, last if succeeded else None)
+
+# ============================================================================
+# READ REPLICA
+# ============================================================================
+
+class SnapshotReplica:
+    """Read-only copies of the databases, refreshed in the background.
+
+    Each refresh copies every source with the SQLite online backup API into a
+    new generation directory and then swaps it in, so open readers never see
+    a file change underneath them. The previous generation is kept for readers
+    still opening it; older ones are deleted.
+
+    A source whose file has not changed since the last copy is linked into the
+    new generation instead of copied again. Changed sources are copied
+    REPLICA_BACKUP_PAGES pages at a time, so writers can take the primary
+    between steps. Every process keeps its generations under its own pid.
+    """
+
+    def __init__(self, directory, max_staleness, sources):
+        self.root = directory
+        self.directory = None
+        self.max_staleness = max_staleness
+        self.sources = sources  # callable returning the database paths to copy
+        self.snapshot = {}
+        self.stamps = {}
+        self.taken_at = None
+        self.generations = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self.run, name='replica-refresh', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        self.directory = os.path.join(self.root, str(os.getpid()))
+        # Generations left behind by processes that have exited
+        try:
+            for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+                if name.isdigit() and (int(name) == os.getpid() or not process_alive(int(name))):
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        except OSError as e:
+            print(f"⚠️  Replica cleanup failed: {e}")
+        
+        # Until the first refresh succeeds, path_for sends reads to the primary
+        while True:
+            try:
+                self.refresh()
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠️  Replica refresh failed: {e}")
+            time.sleep(self.max_staleness / 2)
+
+    def refresh(self):
+        taken_at = time.monotonic()
+        sources = {}
+        for source in self.sources():
+            if os.path.exists(source):
+                sources[os.path.abspath(source)] = file_stamp(source)
+        if self.generations and sources == self.stamps:
+            # Nothing written since the last copy, so it is still current
+            self.taken_at = taken_at
+            return
+        
+        generation = os.path.join(self.directory, str(time.time_ns()))
+        os.makedirs(generation)
+        
+        snapshot = {}
+        for index, (source, stamp) in enumerate(sources.items()):
+            target = os.path.join(generation, f'{index}_{os.path.basename(source)}')
+            if self.stamps.get(source) == stamp:
+                try:
+                    os.link(self.snapshot[source], target)
+                except OSError:
+                    shutil.copyfile(self.snapshot[source], target)
+            else:
+                src = sqlite3.connect(source)
+                dest = sqlite3.connect(target)
+                src.backup(dest, pages=REPLICA_BACKUP_PAGES, sleep=0.001)
+                dest.close()
+                src.close()
+            snapshot[source] = target
+        
+        self.snapshot, self.stamps, self.taken_at = snapshot, sources, taken_at
+        self.generations.append(generation)
+        while len(self.generations) > 2:
+            shutil.rmtree(self.generations.pop(0), ignore_errors=True)
+
+    def path_for(self, source):
+        """Return the snapshot of source, or None if it is missing or too stale"""
+        if self.max_staleness <= 0:
+            return None
+        if self.thread is None:
+            self.start()
+        if self.taken_at is None or time.monotonic() - self.taken_at > self.max_staleness:
+            return None
+        return self.snapshot.get(os.path.abspath(source))
+
+def file_stamp(path):
+    """Modification time and size of a database and its WAL, if any"""
+    stamp = []
+    for name in (path, path + '-wal'):
+        try:
+            st = os.stat(name)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return stamp
+
+def process_alive(pid):
+    """Whether a process with this pid still exists"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+replica = SnapshotReplica(
+    REPLICA_DIR, REPLICA_MAX_STALENESS,
+    lambda: [DB_NAME] + list(list_partitions(PARTITION_DIR).values())
+) if READ_REPLICA else None
+
+def read_connection(path=DB_NAME):
+    """Open a database for a report query, from the replica when it is fresh enough"""
+    snapshot = replica.path_for(path) if replica else None
+    if snapshot is None:
+        return sqlite3.connect(path)
+    conn = sqlite3.connect(Path(snapshot).resolve().as_uri() + '?mode=ro&immutable=1', uri=True)
+    conn.execute(f'PRAGMA mmap_size = {REPLICA_MMAP_BYTES}')
+    return conn
+
 # ============================================================================
 # API ENDPOINTS
 # ============================================================================
@@ -117,8 +674,8 @@ def home():
             'GET /api/procedures': 'Get all procedures',
             'GET /api/search?q=name&type=medicine': 'Search items',
             'POST /api/check-price': 'Check price',
-            'POST /api/verify-bill': 'Verify bill',
-            'GET /api/bills': 'Get all bills',
+            'POST /api/verify-bill': 'Verify bill (JSON or NDJSON stream)',
+            'GET /api/bills?from=YYYY-MM-DD&to=YYYY-MM-DD': 'Get bills (optional bill_date range)',
             'GET /api/stats': 'Get statistics'
         }
     })
@@ -160,6 +717,7 @@ def search_item():
     return jsonify(items)
 
 @app.route('/api/check-price', methods=['POST'])
+@admission_controlled
 def check_price():
     data = request.json
     item_name = data.get('item_name')
@@ -184,10 +742,12 @@ def check_price():
     overcharge = max(0, charged_price - item['govt_max_price'])
     
     if save_to_db:
-        c.execute('''INSERT INTO bills (patient_name, hospital_name, bill_date, total_amount, overcharged)
-                     VALUES (?, ?, ?, ?, ?)''',
-                  ('Quick Check', 'Price Verification', datetime.now().date().isoformat(), charged_price, int(not is_valid)))
-        conn.commit()
+        bill_date = datetime.now().date().isoformat()
+        with attach_partition(conn, bill_date):
+            c.execute('''INSERT INTO part.bills (patient_name, hospital_name, bill_date, total_amount, overcharged)
+                         VALUES (?, ?, ?, ?, ?)''',
+                      ('Quick Check', 'Price Verification', bill_date, charged_price, int(not is_valid)))
+            conn.commit()
     
     conn.close()
     
@@ -200,14 +760,68 @@ def check_price():
         'message': 'Price is within government limits' if is_valid else f'Overcharged by ₹{overcharge:.2f}'
     })
 
+def verify_item(c, item_data):
+    """Look up one bill item and compare it with government limits"""
+    item_name = item_data['name']
+    item_type = item_data['type']
+    charged_price = float(item_data['price'])
+    
+    table = 'medicines' if item_type == 'medicine' else 'procedures'
+    c.execute(f'SELECT * FROM {table} WHERE name LIKE ? LIMIT 1', (f'%{item_name}%',))
+    # fetchall() finishes the statement so it does not keep its read lock
+    rows = c.fetchall()
+    
+    if not rows:
+        return charged_price, None
+    
+    db_item = dict(rows[0])
+    is_valid = db_item['govt_min_price'] <= charged_price <= db_item['govt_max_price']
+    return charged_price, {
+        'item_id': db_item['id'],
+        'item_name': db_item['name'],
+        'item_type': item_type,
+        'charged_price': charged_price,
+        'govt_max_price': db_item['govt_max_price'],
+        'is_overcharged': int(not is_valid)
+    }
+
+def insert_bill_item(c, bill_id, item):
+    c.execute('''INSERT INTO part.bill_items (bill_id, item_type, item_id, item_name, charged_price, govt_max_price, is_overcharged)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)''',
+              (bill_id, item['item_type'], item['item_id'], item['item_name'], 
+               item['charged_price'], item['govt_max_price'], item['is_overcharged']))
+
+def is_ndjson_request():
+    return request.mimetype in ('application/x-ndjson', 'application/jsonl')
+
 @app.route('/api/verify-bill', methods=['POST'])
+@admission_controlled
+@idempotent
 def verify_bill():
+    if request.content_length and request.content_length > MAX_BILL_PAYLOAD_BYTES:
+        return jsonify({'error': f'Payload exceeds {MAX_BILL_PAYLOAD_BYTES} bytes'}), 413
+    
+    if is_ndjson_request():
+        return verify_bill_stream()
+    
+    # A chunked body has no Content-Length and is cut off at MAX_CONTENT_LENGTH
+    if request.content_length is None and len(request.get_data()) >= MAX_BILL_PAYLOAD_BYTES:
+        return jsonify({'error': f'Payload exceeds {MAX_BILL_PAYLOAD_BYTES} bytes'}), 413
+    
     data = request.json
     patient_name = data.get('patient_name')
     hospital_name = data.get('hospital_name')
     bill_date = data.get('bill_date')
     items = data.get('items', [])
     
+    if len(items) > MAX_BILL_ITEMS:
+        return jsonify({'error': f'Bill exceeds {MAX_BILL_ITEMS} items'}), 413
+    
+    try:
+        month_key(bill_date)
+    except ValueError:
+        return jsonify({'error': 'bill_date must be YYYY-MM-DD'}), 400
+    
     conn = sqlite3.connect(DB_NAME)
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
@@ -217,66 +831,169 @@ def verify_bill():
     verified_items = []
     
     for item_data in items:
-        item_name = item_data['name']
-        item_type = item_data['type']
-        charged_price = float(item_data['price'])
+        charged_price, item = verify_item(c, item_data)
         total_amount += charged_price
         
-        table = 'medicines' if item_type == 'medicine' else 'procedures'
-        c.execute(f'SELECT * FROM {table} WHERE name LIKE ? LIMIT 1', (f'%{item_name}%',))
-        db_item = c.fetchone()
-        
-        if db_item:
-            db_item = dict(db_item)
-            is_valid = db_item['govt_min_price'] <= charged_price <= db_item['govt_max_price']
-            if not is_valid:
+        if item:
+            if item['is_overcharged']:
                 has_overcharge = True
-            
-            verified_items.append({
-                'item_id': db_item['id'],
-                'item_name': db_item['name'],
-                'item_type': item_type,
-                'charged_price': charged_price,
-                'govt_max_price': db_item['govt_max_price'],
-                'is_overcharged': int(not is_valid)
-            })
-    
-    # Create bill
-    c.execute('''INSERT INTO bills (patient_name, hospital_name, bill_date, total_amount, overcharged)
-                 VALUES (?, ?, ?, ?, ?)''',
-              (patient_name, hospital_name, bill_date, total_amount, int(has_overcharge)))
-    bill_id = c.lastrowid
-    
-    # Create bill items
-    for item in verified_items:
-        c.execute('''INSERT INTO bill_items (bill_id, item_type, item_id, item_name, charged_price, govt_max_price, is_overcharged)
-                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
-                  (bill_id, item['item_type'], item['item_id'], item['item_name'], 
-                   item['charged_price'], item['govt_max_price'], item['is_overcharged']))
+            verified_items.append(item)
     
-    conn.commit()
+    # Create bill and its items in the bill month's partition
+    with attach_partition(conn, bill_date):
+        c.execute('''INSERT INTO part.bills (patient_name, hospital_name, bill_date, total_amount, overcharged)
+                     VALUES (?, ?, ?, ?, ?)''',
+                  (patient_name, hospital_name, bill_date, total_amount, int(has_overcharge)))
+        bill_id = c.lastrowid
+        
+        for item in verified_items:
+            insert_bill_item(c, bill_id, item)
+        
+        conn.commit()
     conn.close()
     
     return jsonify({'success': True, 'bill_id': bill_id})
 
+def verify_bill_stream():
+    """Verify an NDJSON bill body line by line.
+
+    The first line holds the bill header (patient_name, hospital_name,
+    bill_date); every following line is one item (name, type, price).
+    One result line is streamed back per item, followed by a summary line.
+    """
+    stream = request.stream
+    
+    def read_lines():
+        remaining = MAX_BILL_PAYLOAD_BYTES
+        while True:
+            line = stream.readline(remaining + 1)
+            if not line:
+                return
+            remaining -= len(line)
+            if remaining < 0:
+                raise RequestEntityTooLarge(f'Payload exceeds {MAX_BILL_PAYLOAD_BYTES} bytes')
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+    
+    # The header is checked before streaming starts so a bad one gets a 4xx
+    lines = read_lines()
+    try:
+        header = next(lines, None)
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': e.description}), 413
+    except ValueError:
+        return jsonify({'error': 'First line must be a JSON object'}), 400
+    if not isinstance(header, dict) or not all(header.get(k) for k in ('patient_name', 'hospital_name', 'bill_date')):
+        return jsonify({'error': 'First line must contain patient_name, hospital_name and bill_date'}), 400
+    try:
+        month_key(header['bill_date'])
+    except ValueError:
+        return jsonify({'error': 'bill_date must be YYYY-MM-DD'}), 400
+    
+    def generate():
+        # Catalog lookups use an autocommit connection; nothing is written
+        # until the whole body has been read, so a slow upload holds no locks
+        lookup = sqlite3.connect(DB_NAME, isolation_level=None)
+        lookup.row_factory = sqlite3.Row
+        try:
+            total_amount = 0
+            has_overcharge = False
+            verified_items = []
+            count = 0
+            for item_data in lines:
+                count += 1
+                if count > MAX_BILL_ITEMS:
+                    raise ValueError(f'Bill exceeds {MAX_BILL_ITEMS} items')
+                if not isinstance(item_data, dict):
+                    raise ValueError(f'Item {count} must be a JSON object')
+                
+                charged_price, item = verify_item(lookup.cursor(), item_data)
+                total_amount += charged_price
+                
+                if item:
+                    if item['is_overcharged']:
+                        has_overcharge = True
+                    verified_items.append(item)
+                
+                yield json.dumps({
+                    'line': count,
+                    'name': item_data['name'],
+                    'found': item is not None,
+                    'charged_price': charged_price,
+                    'govt_max_price': item['govt_max_price'] if item else None,
+                    'is_overcharged': bool(item and item['is_overcharged'])
+                }) + '\n'
+            
+            # Write the bill and its items in one short transaction
+            conn = sqlite3.connect(DB_NAME)
+            try:
+                with attach_partition(conn, header['bill_date']):
+                    c = conn.cursor()
+                    c.execute('''INSERT INTO part.bills (patient_name, hospital_name, bill_date, total_amount, overcharged)
+                                 VALUES (?, ?, ?, ?, ?)''',
+                              (header['patient_name'], header['hospital_name'], header['bill_date'],
+                               total_amount, int(has_overcharge)))
+                    bill_id = c.lastrowid
+                    for item in verified_items:
+                        insert_bill_item(c, bill_id, item)
+                    conn.commit()
+            finally:
+                conn.close()
+            
+            yield json.dumps({
+                'success': True,
+                'bill_id': bill_id,
+                'items': count,
+                'total_amount': total_amount,
+                'overcharged': has_overcharge
+            }) + '\n'
+        except RequestEntityTooLarge as e:
+            yield json.dumps({'success': False, 'error': e.description}) + '\n'
+        except (ValueError, KeyError, TypeError, sqlite3.Error) as e:
+            yield json.dumps({'success': False, 'error': str(e)}) + '\n'
+        finally:
+            lookup.close()
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 @app.route('/api/bills')
 def get_bills():
-    conn = sqlite3.connect(DB_NAME)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-    c.execute('SELECT * FROM bills ORDER BY created_at DESC')
-    bills = [dict(row) for row in c.fetchall()]
-    conn.close()
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    try:
+        paths = bill_partitions(date_from, date_to)
+    except ValueError:
+        return jsonify({'error': 'from/to must be YYYY-MM-DD'}), 400
+    
+    query = 'SELECT * FROM bills WHERE bill_date >= ? AND bill_date <= ?'
+    params = (date_from or '0000-00-00', date_to or '9999-99-99')
+    bills = []
+    for path in paths:
+        conn = read_connection(path)
+        conn.row_factory = sqlite3.Row
+        bills.extend(dict(row) for row in conn.execute(query, params))
+        conn.close()
+    bills.sort(key=lambda b: b['created_at'], reverse=True)
     return jsonify(bills)
 
 @app.route('/api/stats')
 def get_stats():
-    conn = sqlite3.connect(DB_NAME)
+    total = overcharged = 0
+    for path in bill_partitions():
+        conn = read_connection(path)
+        row = conn.execute('SELECT COUNT(*), COALESCE(SUM(overcharged), 0) FROM bills').fetchone()
+        conn.close()
+        total += row[0]
+        overcharged += row[1]
+    
+    conn = read_connection()
     c = conn.cursor()
-    c.execute('SELECT COUNT(*) FROM bills')
-    total = c.fetchone()[0]
-    c.execute('SELECT COUNT(*) FROM bills WHERE overcharged = 1')
-    overcharged = c.fetchone()[0]
+    # Archived months are counted from the summary taken when they were archived
+    c.execute('SELECT COALESCE(SUM(total_bills), 0), COALESCE(SUM(overcharged_bills), 0) FROM bill_archive')
+    archived_total, archived_overcharged = c.fetchone()
+    total += archived_total
+    overcharged += archived_overcharged
     c.execute('SELECT COUNT(*) FROM complaints')
     complaints = c.fetchone()[0]
     conn.close()
@@ -289,6 +1006,7 @@ def get_stats():
     })
 
 @app.route('/api/complaints', methods=['POST'])
+@idempotent
 def file_complaint():
     data = request.json
     bill_id = data.get('bill_id')
@@ -314,7 +1032,7 @@ def file_complaint():
 
 @app.route('/api/complaints')
 def get_complaints():
-    conn = sqlite3.connect(DB_NAME)
+    conn = read_connection()
     conn.row_factory = sqlite3.Row
     c = conn.cursor()
     c.execute('SELECT * FROM complaints ORDER BY created_at DESC')
@@ -327,6 +1045,13 @@ def get_complaints():
 # ============================================================================
 
 if __name__ == '__main__':
+    import sys
+    
     init_db()
-    print("🚀 Server starting on http://127.0.0.1:5000")
-    app.run(debug=True, port=5000)
+    if len(sys.argv) > 1 and sys.argv[1] == 'archive':
+        months = int(sys.argv[2]) if len(sys.argv) > 2 else ARCHIVE_AFTER_MONTHS
+        archived = archive_partitions(months)
+        print(f"✅ Archived {len(archived)} partition(s): {', '.join(map(partition_file, archived)) or 'none'}")
+    else:
+        print("🚀 Server starting on http://127.0.0.1:5000")
+        app.run(debug=True, port=5000)